@@ -8,6 +8,16 @@ print("Current working directory:", os.getcwd())
 try:
     import PIL
     print("PIL version:", PIL.__version__)
+    # Pillow-SIMD publishes its releases as post-releases of Pillow (e.g. 9.0.0.post1)
+    if ".post" in PIL.__version__:
+        print("Pillow-SIMD detected")
+    else:
+        print("Warning: stock Pillow detected. For faster resizing install Pillow-SIMD (Linux/macOS):")
+        print('  pip uninstall pillow && CFLAGS="-mavx2" pip install --no-binary :all: pillow-simd')
+
+    # Report the codec libraries Pillow was built with (libjpeg-turbo, libwebp, zlib...)
+    from PIL import features
+    features.pilinfo(supported_formats=False)
 except ImportError:
     print("PIL not installed")
 
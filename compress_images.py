@@ -17,18 +17,24 @@ Features:
 
 import os
 import sys
-import re
-import time
-import random
-import unicodedata
+import io
 import shutil
+from collections import Counter
+from functools import partial
+from itertools import chain, islice
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from datetime import datetime
 
+# Dependency notes are printed once by main() rather than at import time, since
+# worker processes on spawn platforms (Windows, macOS) re-import this module
+DEPENDENCY_NOTES = []
+
 # Try to import required packages
 try:
-    from PIL import Image
-    print("Pillow is installed.")
+    from PIL import Image, ImageOps, ExifTags, UnidentifiedImageError, __version__ as PIL_VERSION
+    DEPENDENCY_NOTES.append(f"Pillow {PIL_VERSION} is installed.")
 except ImportError:
     print("Pillow (PIL) is required for this script.")
     print("Please install it with: pip install pillow")
@@ -37,11 +43,10 @@ except ImportError:
 # Try to import optional packages for enhanced UI
 try:
     from colorama import init, Fore, Style
-    init()  # Initialize colorama
     COLOR_SUPPORT = True
 except ImportError:
     COLOR_SUPPORT = False
-    print("For colored output, install colorama: pip install colorama")
+    DEPENDENCY_NOTES.append("For colored output, install colorama: pip install colorama")
 
 # Try to import tqdm for progress bar
 try:
@@ -49,10 +54,131 @@ try:
     PROGRESS_BAR_SUPPORT = True
 except ImportError:
     PROGRESS_BAR_SUPPORT = False
-    print("For progress bar support, install tqdm: pip install tqdm")
+    DEPENDENCY_NOTES.append("For progress bar support, install tqdm: pip install tqdm")
+
+# numpy is installed with PyTurboJPEG and OpenCV, and only used by their fast paths
+try:
+    import numpy as np
+except ImportError:
+    pass
+
+# Try to import PyTurboJPEG for faster JPEG decode/encode through libjpeg-turbo
+try:
+    from turbojpeg import (TurboJPEG, TJCS_GRAY, TJFLAG_PROGRESSIVE, TJPF_GRAY, TJPF_RGB,
+                           TJSAMP_GRAY, TJSAMP_420)
+    turbo_jpeg = TurboJPEG()
+    TURBOJPEG_SUPPORT = True
+except (ImportError, OSError, RuntimeError):
+    TURBOJPEG_SUPPORT = False
+    DEPENDENCY_NOTES.append("For faster JPEG compression, install PyTurboJPEG: pip install PyTurboJPEG")
+
+# Try to import the Numba-compiled Lanczos resampler. It outruns stock Pillow's
+# resize but not Pillow-SIMD's, so it is left unused when Pillow-SIMD is installed
+# (Pillow-SIMD versions carry a '.post' suffix). Numba raises RuntimeError at
+# import when it has nowhere writable to cache the compiled kernels.
+PILLOW_SIMD = '.post' in PIL_VERSION
+try:
+    from resize_lanczos import lanczos_resize
+    NUMBA_SUPPORT = not PILLOW_SIMD
+except ImportError:
+    NUMBA_SUPPORT = False
+    if not PILLOW_SIMD:
+        DEPENDENCY_NOTES.append("For faster resizing, install numba: pip install numba")
+except RuntimeError as e:
+    NUMBA_SUPPORT = False
+    if not PILLOW_SIMD:
+        DEPENDENCY_NOTES.append(f"Numba resizing is unavailable: {e}")
+
+# Try to import CuPy for Lanczos resizing on an NVIDIA GPU. Only offered when a
+# device is present, so there is no install hint for machines without one.
+try:
+    import cupy
+    from resize_lanczos import lanczos_resize_cuda
+    CUDA_SUPPORT = cupy.cuda.runtime.getDeviceCount() > 0
+except (ImportError, RuntimeError):
+    CUDA_SUPPORT = False
+
+# Try to import mozjpeg's lossless optimizer, which repacks JPEG output with
+# smarter progressive scans at the 'smallest' encoding effort
+try:
+    import mozjpeg_lossless_optimization
+    MOZJPEG_SUPPORT = True
+except ImportError:
+    MOZJPEG_SUPPORT = False
+    DEPENDENCY_NOTES.append("For smaller JPEGs, install mozjpeg-lossless-optimization: pip install mozjpeg-lossless-optimization")
+
+# Try to import OpenCV for fast area-averaging on heavy downscales
+try:
+    import cv2
+    CV2_SUPPORT = True
+except ImportError:
+    CV2_SUPPORT = False
+    DEPENDENCY_NOTES.append("For faster large downscales, install OpenCV: pip install opencv-python-headless")
 
 # Supported image formats
-SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff']
+SUPPORTED_FORMATS = frozenset(['.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff'])
+
+# The same suffixes as a tuple, for a single str.endswith check
+SUPPORTED_SUFFIXES = tuple(SUPPORTED_FORMATS)
+
+# Pillow's resize first box-reduces by an integer factor while the result stays at
+# least this many times the target size, then runs Lanczos on the smaller image
+REDUCING_GAP = 3.0
+
+# Encoding effort levels: 'fast' skips JPEG's Huffman pass and uses WebP's fastest
+# method for bulk jobs; 'smallest' uses WebP's slowest method and mozjpeg
+ENCODING_EFFORTS = ('standard', 'fast', 'smallest')
+WEBP_METHODS = {'fast': 0, 'standard': 4, 'smallest': 6}
+
+# At or above this quality, a JPEG that keeps its format and size is linked to its
+# output instead of re-encoded when its quantization tables are already as coarse
+# as the target quality's, since re-encoding it then can't shrink it. WebP isn't
+# linked: lossy WebP files don't record their quality, and lossless ones shrink.
+PASSTHROUGH_QUALITY = 95
+PASSTHROUGH_SUFFIXES = frozenset(['.jpg', '.jpeg'])
+
+# The IJG base quantization tables (luminance, chrominance) that libjpeg scales
+# by quality; the order of the values doesn't matter here, only their sums do
+JPEG_BASE_TABLES = (
+    (16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+     14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+     18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+     49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99),
+    (17, 18, 24, 47, 99, 99, 99, 99, 18, 21, 26, 66, 99, 99, 99, 99,
+     24, 26, 56, 99, 99, 99, 99, 99, 47, 66, 99, 99, 99, 99, 99, 99) + (99,) * 32,
+)
+
+# EXIF orientations that swap width and height (the 90 and 270 degree ones)
+TRANSPOSED_ORIENTATIONS = frozenset([5, 6, 7, 8])
+
+# Pillow decoders for the supported formats; Image.open only tries these plugins
+PILLOW_FORMATS = ('JPEG', 'PNG', 'WEBP', 'BMP', 'TIFF')
+
+# Modes each output format is saved in as is; convert_for_output changes the
+# rest first. JPEG output is always 8-bit gray or RGB, CMYK included. L and LA
+# stay single-channel for WebP through the resize; the encoder widens them.
+STORABLE_MODES = {
+    'JPEG': ('L', 'RGB'),
+    'WEBP': ('L', 'LA', 'RGB', 'RGBA'),
+    'PNG': ('1', 'L', 'LA', 'I;16', 'I;16B', 'P', 'RGB', 'RGBA'),
+}
+
+# Pillow save format for each output_format choice; 'original' has none and
+# keeps each source's own format
+SAVE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG'}
+
+# Read buffer for the files Pillow decodes. Its decoders read in 64KB blocks, so
+# a large buffer turns those into far fewer read calls on network mounts.
+READ_BUFFER_SIZE = 1 << 20
+
+# How many files ahead of the workers to ask the kernel to read into the page cache
+PREFETCH_DEPTH = 32
+
+# Below this average input size a run is dominated by file I/O rather than codec
+# work, so threads are used instead of processes (Pillow releases the GIL while
+# decoding and encoding). The average is taken over the first files found.
+SMALL_FILE_THRESHOLD = 200 * 1024
+EXECUTOR_SAMPLE_SIZE = 64
 
 # Size presets
 SIZE_PRESETS = {
@@ -62,225 +188,644 @@ SIZE_PRESETS = {
 }
 
 # Helper functions for colored output
+# Escape codes put around printed messages, looked up once; empty without colorama
+if COLOR_SUPPORT:
+    INFO_COLOR, SUCCESS_COLOR, WARNING_COLOR, ERROR_COLOR = Fore.CYAN, Fore.GREEN, Fore.YELLOW, Fore.RED
+    HEADER_COLOR = Fore.MAGENTA + Style.BRIGHT
+    RESET_COLOR = Style.RESET_ALL
+else:
+    INFO_COLOR = SUCCESS_COLOR = WARNING_COLOR = ERROR_COLOR = HEADER_COLOR = RESET_COLOR = ''
+
 def print_info(message):
     """Print an info message, with color if available."""
-    if COLOR_SUPPORT:
-        print(f"{Fore.CYAN}{message}{Style.RESET_ALL}")
-    else:
-        print(message)
+    print(f"{INFO_COLOR}{message}{RESET_COLOR}")
 
 def print_success(message):
     """Print a success message, with color if available."""
-    if COLOR_SUPPORT:
-        print(f"{Fore.GREEN}{message}{Style.RESET_ALL}")
-    else:
-        print(message)
+    print(f"{SUCCESS_COLOR}{message}{RESET_COLOR}")
 
 def print_warning(message):
     """Print a warning message, with color if available."""
-    if COLOR_SUPPORT:
-        print(f"{Fore.YELLOW}{message}{Style.RESET_ALL}")
-    else:
-        print(message)
+    print(f"{WARNING_COLOR}{message}{RESET_COLOR}")
 
 def print_error(message):
     """Print an error message, with color if available."""
-    if COLOR_SUPPORT:
-        print(f"{Fore.RED}{message}{Style.RESET_ALL}")
-    else:
-        print(message)
+    print(f"{ERROR_COLOR}{message}{RESET_COLOR}")
 
 def print_header(message):
     """Print a header message, with color if available."""
     if COLOR_SUPPORT:
-        print(f"{Fore.MAGENTA}{Style.BRIGHT}{message}{Style.RESET_ALL}")
+        print(f"{HEADER_COLOR}{message}{RESET_COLOR}")
     else:
         print("=" * 60)
         print(message)
         print("=" * 60)
 
+# Map the message levels used in compress_image results to their printers
+MESSAGE_PRINTERS = {
+    'info': print_info,
+    'success': print_success,
+    'warning': print_warning,
+    'error': print_error
+}
+
+def print_messages(messages):
+    """Print the (level, message) pairs collected by a compress_image call."""
+    for level, message in messages:
+        MESSAGE_PRINTERS[level](message)
+
 def generate_filename(original_filename, size_preset, output_format):
     """Generate filename with size suffix and format: original_name.size.format"""
-    # Get the base name without extension
-    base_name = os.path.splitext(original_filename)[0]
+    # Split off the extension once
+    base_name, extension = os.path.splitext(original_filename)
     
     # Determine the output extension
     if output_format and output_format != 'original':
         extension = f'.{output_format}'
-    else:
-        extension = os.path.splitext(original_filename)[1]
     
     # Create the new filename: original_name.size.extension
     new_filename = f"{base_name}.{size_preset}{extension}"
     
     return new_filename
 
-def compress_image(input_path, output_path, quality=85, max_width=1920, output_format=None, preserve_original=False, size_preset='lg'):
-    """Compress an image with the specified settings."""
+def resize_image(img, new_size, use_gpu=False):
+    """Resize a Pillow image to new_size.
+
+    With use_gpu, Lanczos runs on the GPU. Otherwise shrinking to less than
+    half the width uses OpenCV's area averaging, which is faster than Lanczos
+    and looks the same at that ratio. Other resizes use Lanczos, through the
+    Numba kernel when it applies, after the same whole-factor box reduction
+    Pillow's reducing_gap does.
+    """
+    # Modes with alpha or a palette need Pillow's premultiply/convert handling
+    if img.mode in ('RGB', 'L'):
+        if use_gpu:
+            return Image.fromarray(lanczos_resize_cuda(img, *new_size))
+        if CV2_SUPPORT and img.width > 2 * new_size[0]:
+            return Image.fromarray(cv2.resize(np.asarray(img), new_size, interpolation=cv2.INTER_AREA))
+        if NUMBA_SUPPORT:
+            # Box-reduce by whole factors first, as Pillow's reducing_gap does, so
+            # the kernel never filters at the full source size on a big shrink
+            factors = (int(img.width / new_size[0] / REDUCING_GAP) or 1, int(img.height / new_size[1] / REDUCING_GAP) or 1)
+            if factors != (1, 1):
+                img = img.reduce(factors)
+            return Image.fromarray(lanczos_resize(img, *new_size))
+    return img.resize(new_size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+
+def jpeg_scaling_factor(width, height, new_size):
+    """Pick the smallest 1/2, 1/4 or 1/8 DCT scaling that still decodes to at least new_size.
+
+    libjpeg-turbo can decode straight to these scales, which skips most of
+    the IDCT work when shrinking large JPEGs. They are the same scales
+    Image.draft uses on the Pillow path.
+    """
+    factor = (1, 1)
+    for denom in (2, 4, 8):
+        if -(-width // denom) < new_size[0] or -(-height // denom) < new_size[1]:
+            break
+        factor = (1, denom)
+    return factor
+
+def encode_jpeg_turbo(input_path, quality, max_width, effort='standard', use_gpu=False, save_format='JPEG'):
+    """Decode, resize and re-encode a JPEG through libjpeg-turbo, bypassing Pillow's codec.
+
+    Files libjpeg-turbo can't decode to RGB or grayscale (CMYK/YCCK JPEGs, or
+    files that aren't really JPEGs) are handed to encode_with_pillow instead,
+    along with save_format. With save_format None, a .jpg that isn't really a
+    JPEG is then saved in its own format, as it is when PyTurboJPEG is missing.
+
+    Returns the original (width, height), the resized (width, height) or
+    None if the image did not need resizing, the encoded bytes, and the
+    Pillow format they are in.
+    """
+    with open(input_path, 'rb') as f:
+        data = f.read()
+
+    # Rotated or mirrored photos take the Pillow path, which applies the EXIF
+    # orientation; parsing the header for it decodes no pixels. Files that aren't
+    # JPEGs take it too. Other errors stay out of the try below, so a truncated
+    # JPEG isn't retried with a second Pillow decode.
     try:
-        with Image.open(input_path) as img:
-            # Get original format if output_format is None
-            img_format = output_format or img.format
-
-            # Convert format string to Pillow format
-            if img_format.lower() == 'webp':
-                save_format = 'WEBP'
-            elif img_format.lower() in ['jpg', 'jpeg']:
-                save_format = 'JPEG'
-            else:
-                save_format = img_format.upper()
+        with Image.open(input_path, formats=['JPEG']) as img:
+            use_pillow = img.getexif().get(ExifTags.Base.Orientation, 1) != 1
+    except UnidentifiedImageError:
+        use_pillow = True
+    if use_pillow:
+        return encode_with_pillow(input_path, quality, max_width, save_format, effort, use_gpu)
+
+    try:
+        width, height, _, colorspace = turbo_jpeg.decode_header(data)
+        # Keep grayscale JPEGs single-channel; match Pillow's 4:2:0 default otherwise
+        if colorspace == TJCS_GRAY:
+            pixel_format, subsample = TJPF_GRAY, TJSAMP_GRAY
+        else:
+            pixel_format, subsample = TJPF_RGB, TJSAMP_420
+
+        # Resize if width exceeds max_width
+        new_size = None
+        scaling_factor = None
+        if width > max_width:
+            ratio = max_width / width
+            new_size = (max_width, int(height * ratio))
+            scaling_factor = jpeg_scaling_factor(width, height, new_size)
+
+        pixels = turbo_jpeg.decode(data, pixel_format=pixel_format, scaling_factor=scaling_factor)
+    except OSError:
+        return encode_with_pillow(input_path, quality, max_width, save_format, effort, use_gpu)
+
+    if new_size is not None and pixels.shape[1::-1] != new_size:
+        if use_gpu:
+            pixels = lanczos_resize_cuda(pixels, *new_size)
+        elif NUMBA_SUPPORT:
+            pixels = lanczos_resize(pixels, *new_size)
+        else:
+            resized = Image.fromarray(pixels[:, :, 0] if pixel_format == TJPF_GRAY else pixels).resize(new_size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+            pixels = np.asarray(resized).reshape(new_size[1], new_size[0], -1)
+
+    # Progressive encoding also builds optimized Huffman tables, like optimize=True in Pillow
+    data = turbo_jpeg.encode(pixels, quality=quality, pixel_format=pixel_format,
+                             jpeg_subsample=subsample, flags=0 if effort == 'fast' else TJFLAG_PROGRESSIVE)
+
+    return (width, height), new_size, data, 'JPEG'
+
+def save_options(save_format, quality, effort):
+    """Return the Image.save keyword arguments for a Pillow format.
+
+    Each format spends its extra encoding effort differently: JPEG's optimize
+    is a second Huffman pass, skipped at 'fast' effort; PNG's optimize is
+    always worth it; and WebP ignores optimize and uses method instead.
+    """
+    if save_format == 'JPEG':
+        return {'quality': quality, 'optimize': effort != 'fast'}
+    if save_format == 'WEBP':
+        return {'quality': quality, 'method': WEBP_METHODS[effort]}
+    if save_format == 'PNG':
+        return {'optimize': True}
+    return {'quality': quality}
+
+def to_8bit(img):
+    """Convert a 16-bit or 32-bit grayscale image to 'L', scaling its values down.
+
+    Pillow's own conversion clips at 255, which turns most 16-bit images
+    white. I;16 images are always scaled; I and F ones only when their values
+    go above 255.
+    """
+    if img.mode.startswith('I;16'):
+        img = img.convert('I')
+    elif img.getextrema()[1] <= 255:
+        return img.convert('L')
+    return img.point(lambda value: value / 256).convert('L')
+
+def to_16bit(img):
+    """Convert a 32-bit integer or float grayscale image to 'I;16' for PNG output.
+
+    Pillow is dropping PNG output of mode 'I', and converting to 'I;16' clips
+    values outside 0-65535, so those images are scaled into that range first.
+    """
+    if img.mode != 'F':
+        img = img.convert('I')
+    low, high = img.getextrema()
+    if low < 0 or high > 65535:
+        low, high = min(low, 0), max(high, 65535)
+        img = img.point(lambda value: (value - low) * 65535 / (high - low))
+    if img.mode == 'F':
+        img = img.convert('I')
+    return img.convert('I;16')
+
+def convert_for_output(img, save_format):
+    """Return img in a mode save_format can store, converting it only when needed.
+
+    The conversion runs before the resize, so the resize works on the data the
+    encoder gets. Palette images become RGB(A) for JPEG and WebP, since Pillow
+    resizes palettes with nearest-neighbour. Formats without an entry in
+    STORABLE_MODES ('original' runs to BMP or TIFF) are left to Pillow.
+    """
+    storable = STORABLE_MODES.get(save_format)
+    if storable is None or img.mode in storable:
+        return img
+    if img.mode.startswith('I') or img.mode == 'F':
+        return to_16bit(img) if save_format == 'PNG' else to_8bit(img)
+
+    gray = img.mode in ('1', 'L', 'LA', 'La')
+    alpha = save_format != 'JPEG' and (img.mode in ('RGBA', 'RGBa', 'LA', 'La', 'PA') or 'transparency' in img.info)
+    return img.convert(('L' if gray else 'RGB') + ('A' if alpha else ''))
+
+def open_buffered_image(f, input_path):
+    """Open an image from the buffered file f, which was opened from input_path.
+
+    Pillow names the file object rather than the path when it can't identify
+    one, so the error is raised again with the path, as Image.open(path) gives it.
+    """
+    try:
+        return Image.open(f, formats=PILLOW_FORMATS)
+    except UnidentifiedImageError:
+        raise UnidentifiedImageError(f"cannot identify image file {str(input_path)!r}") from None
+
+def encode_with_pillow(input_path, quality, max_width, save_format, effort='standard', use_gpu=False):
+    """Decode, resize and re-encode an image with Pillow.
+
+    save_format is a Pillow format name such as 'JPEG', or None to save in
+    the source's own format.
+
+    Returns the original (width, height), the resized (width, height) or
+    None if the image did not need resizing, the encoded bytes, and the
+    Pillow format they are in.
+    """
+    with open(input_path, 'rb', buffering=READ_BUFFER_SIZE) as f, open_buffered_image(f, input_path) as img:
+        # Keep the source's format when no output format was chosen
+        save_format = save_format or img.format
+
+        # Sizes are as displayed, so photos rotated by their EXIF orientation are
+        # measured with width and height swapped
+        orientation = img.getexif().get(ExifTags.Base.Orientation, 1)
+        width, height = img.size
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        new_size = None
+
+        # Resize if width exceeds max_width
+        if width > max_width:
+            ratio = max_width / width
+            new_size = (max_width, int(height * ratio))
+            # Let libjpeg decode at a reduced 1/2, 1/4 or 1/8 scale that is still at
+            # least new_size, leaving less work for the Lanczos resize
+            if img.format == 'JPEG':
+                img.draft(img.mode, new_size[::-1] if orientation in TRANSPOSED_ORIENTATIONS else new_size)
+
+        # The output carries no EXIF, so bake the orientation into the pixels. This
+        # and the mode conversion run before the resize, on the draft-sized image.
+        if orientation != 1:
+            img = ImageOps.exif_transpose(img)
+        img = convert_for_output(img, save_format)
 
-            # Get original dimensions and size
-            width, height = img.size
+        if new_size is not None:
+            img = resize_image(img, new_size, use_gpu)
+
+        # Encode into memory so the caller can check the size before writing anything
+        buffer = io.BytesIO()
+        img.save(buffer, format=save_format, **save_options(save_format, quality, effort))
+
+    return (width, height), new_size, buffer.getbuffer(), save_format
+
+def jpeg_table_sums(quality):
+    """Return the sums of the luminance and chrominance tables libjpeg uses at quality."""
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    return [sum(min(max((value * scale + 50) // 100, 1), 255) for value in table)
+            for table in JPEG_BASE_TABLES]
+
+def is_passthrough(input_path, output_path, quality, max_width):
+    """Tell whether compressing would only re-encode a JPEG as itself without shrinking it.
+
+    That is when each of its quantization tables is at least as coarse (sums to
+    at least as much) as the one libjpeg would use at quality.
+    """
+    if quality < PASSTHROUGH_QUALITY:
+        return False
+    if Path(input_path).suffix.lower() not in PASSTHROUGH_SUFFIXES or output_path.suffix.lower() not in PASSTHROUGH_SUFFIXES:
+        return False
+    # Opening only parses the header; the pixels are never decoded here. The width
+    # is the displayed one, as in encode_with_pillow, so rotated photos that are
+    # too tall on disk but too wide on screen still get resized.
+    with Image.open(input_path, formats=PILLOW_FORMATS) as img:
+        if img.format != 'JPEG':
+            return False
+        rotated = img.getexif().get(ExifTags.Base.Orientation, 1) in TRANSPOSED_ORIENTATIONS
+        if (img.height if rotated else img.width) > max_width:
+            return False
+        tables = img.quantization
+        return 0 in tables and all(sum(tables[i]) >= target
+                                   for i, target in enumerate(jpeg_table_sums(quality)) if i in tables)
+
+def temporary_path(input_path, output_path):
+    """Return the temporary file an output is written to before being moved into place.
+
+    Sources that differ only in their extension (photo.jpg, photo.png) share an
+    output name, so the temporary name keeps the source extension to stop
+    concurrent tasks writing the same file. The process ID keeps two runs over
+    the same directory apart as well.
+    """
+    return output_path.with_suffix(f"{output_path.suffix}{Path(input_path).suffix}.{os.getpid()}.tmp")
+
+def link_or_copy(input_path, output_path):
+    """Hard-link the source to output_path, replacing it, or copy it where links aren't supported."""
+    temp_output_path = temporary_path(input_path, output_path)
+    temp_output_path.unlink(missing_ok=True)
+    try:
+        os.link(input_path, temp_output_path)
+    except OSError:
+        shutil.copy2(input_path, temp_output_path)
+    os.replace(temp_output_path, output_path)
+
+def compress_image(input_path, output_path, quality=85, max_width=1920, output_format=None, preserve_original=False, size_preset='lg', original_size=None, backup_dir=None, effort='standard', use_gpu=False, save_format=None):
+    """Compress an image with the specified settings.
+
+    save_format is the Pillow format output_format maps to; make_compressor
+    resolves it once per run, and it is looked up here when not given.
+
+    original_size can be passed when the caller already knows the input's
+    size (e.g. from the directory scan), saving a stat call. Likewise
+    backup_dir can name the 'originals' directory; it is created on the first
+    backup made into it.
+
+    Runs in a worker process, so messages are returned in the result dict
+    under 'messages' instead of being printed here.
+    """
+    messages = []
+    try:
+        if original_size is None:
             original_size = os.path.getsize(input_path)
-            was_resized = False
+        if save_format is None and output_format:
+            save_format = SAVE_FORMATS.get(output_format.lower())
 
-            # Resize if width exceeds max_width
-            if width > max_width:
-                ratio = max_width / width
-                new_height = int(height * ratio)
-                img = img.resize((max_width, new_height), Image.LANCZOS)
-                was_resized = True
-                print_info(f"Resized from {width}x{height} to {max_width}x{new_height}")
+        passthrough = is_passthrough(input_path, output_path, quality, max_width)
+        if passthrough:
+            # Skip the decode and encode entirely and give the output the source's bytes
+            link_or_copy(input_path, output_path)
+            compressed_size = original_size
+            was_resized = False
+            reduction = 0.0
+            messages.append(('success', f"Kept as is, already at the target size and quality: {input_path} -> {output_path}"))
+        else:
+            # JPEG to JPEG goes straight through libjpeg-turbo when available
+            if (TURBOJPEG_SUPPORT and save_format in ('JPEG', None)
+                    and Path(input_path).suffix.lower() in ('.jpg', '.jpeg')):
+                (width, height), new_size, data, written_format = encode_jpeg_turbo(input_path, quality, max_width, effort, use_gpu, save_format)
+            else:
+                (width, height), new_size, data, written_format = encode_with_pillow(input_path, quality, max_width, save_format, effort, use_gpu)
 
-            # Create a temporary file for compression
-            temp_output_path = str(output_path) + ".temp"
+            # At the smallest effort, let mozjpeg repack JPEG output losslessly. This
+            # goes by what was encoded, since an 'original' run keeps a .jpg that
+            # really holds PNG data as PNG.
+            if effort == 'smallest' and MOZJPEG_SUPPORT and written_format == 'JPEG':
+                data = mozjpeg_lossless_optimization.optimize(bytes(data))
+            compressed_size = len(data)
 
-            # Save with compression
-            img.save(temp_output_path, format=save_format, quality=quality, optimize=True)
+            was_resized = new_size is not None
+            if was_resized:
+                messages.append(('info', f"Resized from {width}x{height} to {new_size[0]}x{new_size[1]}"))
 
             # Get file size reduction
-            compressed_size = os.path.getsize(temp_output_path)
             reduction = (1 - compressed_size / original_size) * 100
 
             # Check if the compression actually reduced the file size
             if compressed_size >= original_size and not was_resized and output_path.suffix == Path(input_path).suffix:
-                print_warning(f"Compression did not reduce file size for {input_path}")
-                if os.path.exists(temp_output_path):
-                    os.remove(temp_output_path)
-                return False
-
-            # Move the temporary file to the final destination
-            if os.path.exists(output_path):
-                os.remove(output_path)
-            os.rename(temp_output_path, output_path)
-
-            # If preserve_original is True and the output path is different from the input path,
-            # create a backup of the original file
-            if preserve_original and str(input_path) != str(output_path):
+                messages.append(('warning', f"Compression did not reduce file size for {input_path}"))
+                return {'success': False, 'error': 'no_reduction', 'messages': messages}
+
+            # Write to a temporary file in one call, then move it to the final
+            # destination, replacing any existing file
+            temp_output_path = temporary_path(input_path, output_path)
+            try:
+                with open(temp_output_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_output_path, output_path)
+            except Exception:
+                temp_output_path.unlink(missing_ok=True)
+                raise
+
+        # If preserve_original is True and the output path is different from the input path,
+        # create a backup of the original file
+        if preserve_original and str(input_path) != str(output_path):
+            if backup_dir is None:
                 backup_dir = Path(input_path).parent / "originals"
+            backup_path = backup_dir / Path(input_path).name
+            if not backup_path.exists():
                 backup_dir.mkdir(exist_ok=True)
-                backup_path = backup_dir / Path(input_path).name
-                if not backup_path.exists():
+                # A hard link costs no copy or extra space; copy where links aren't
+                # supported (across filesystems, or on some network and FAT drives)
+                try:
+                    os.link(input_path, backup_path)
+                except OSError:
                     shutil.copy2(input_path, backup_path)
 
-            # Print compression results
-            print_success(f"Compressed: {input_path} -> {output_path}")
+        # Print compression results; a file kept as is already has its one message
+        if not passthrough:
+            messages.append(('success', f"Compressed: {input_path} -> {output_path}"))
             if reduction > 0:
-                print_success(f"Size reduction: {original_size/1024:.1f}KB -> {compressed_size/1024:.1f}KB ({reduction:.1f}%)")
+                messages.append(('success', f"Size reduction: {original_size/1024:.1f}KB -> {compressed_size/1024:.1f}KB ({reduction:.1f}%)"))
             else:
-                print_warning(f"Size change: {original_size/1024:.1f}KB -> {compressed_size/1024:.1f}KB ({reduction:.1f}%)")
-
-            # Return compression statistics
-            return {
-                'success': True,
-                'original_size': original_size,
-                'compressed_size': compressed_size,
-                'reduction': reduction,
-                'was_resized': was_resized
-            }
+                messages.append(('warning', f"Size change: {original_size/1024:.1f}KB -> {compressed_size/1024:.1f}KB ({reduction:.1f}%)"))
+
+        # Return compression statistics
+        return {
+            'success': True,
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'reduction': reduction,
+            'was_resized': was_resized,
+            'messages': messages
+        }
     except PermissionError:
-        print_error(f"Permission denied: Cannot access {input_path} or write to {output_path}")
-        return {'success': False, 'error': 'permission_denied'}
+        messages.append(('error', f"Permission denied: Cannot access {input_path} or write to {output_path}"))
+        return {'success': False, 'error': 'permission_denied', 'messages': messages}
     except Exception as e:
-        print_error(f"Error processing {input_path}: {e}")
-        return {'success': False, 'error': str(e)}
+        messages.append(('error', f"Error processing {input_path}: {e}"))
+        return {'success': False, 'error': str(e), 'messages': messages}
+
+def prefetch_file(path):
+    """Ask the kernel to start reading a file into the page cache in the background.
 
-def process_directory(directory, quality, max_width, output_format, preserve_original=False, size_preset='lg', in_place=False):
+    This is only a hint; it does nothing on platforms without posix_fadvise
+    (e.g. Windows) or if the file can't be opened.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+def make_compressor(quality, max_width, output_format, preserve_original, size_preset, effort='standard', use_gpu=False):
+    """Bind the per-run settings to compress_image once.
+
+    Call the result as compress(input_path, output_path, original_size=..., backup_dir=...).
+    It is a functools.partial rather than a closure so it can be pickled for
+    the worker processes.
+    """
+    return partial(compress_image, quality=quality, max_width=max_width, output_format=output_format,
+                   preserve_original=preserve_original, size_preset=size_preset,
+                   effort=effort, use_gpu=use_gpu, save_format=SAVE_FORMATS.get(output_format))
+
+def iter_images(root, skip_dir_name=None):
+    """Yield (path, size in bytes) for the supported images under root, recursively.
+
+    Each directory is listed in full before its entries are yielded, so output
+    files written next to the originals while the walk is still running are
+    never picked up. Directories named skip_dir_name are not descended into.
+    The size comes from the DirEntry's stat, which os.scandir may already
+    have cached (it always does on Windows). Directories that can't be read
+    (lost+found, System Volume Information) are skipped with a warning.
+    """
+    try:
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError as e:
+        print_warning(f"Skipping unreadable directory {root}: {e}")
+        return
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name != skip_dir_name:
+                yield from iter_images(entry.path, skip_dir_name)
+        elif entry.name.lower().endswith(SUPPORTED_SUFFIXES) and entry.is_file():
+            yield entry.path, entry.stat().st_size
+
+def process_directory(directory, quality, max_width, output_format, preserve_original=False, size_preset='lg', in_place=False, effort='standard', use_gpu=False, verbose=False):
     """Process all images in a directory and its subdirectories."""
     directory = Path(directory)
     if not directory.exists():
         print_error(f"Directory not found: {directory}")
         return
 
-    # Count total images for progress tracking
+    # Create a timestamp for the report
+    started = datetime.now()
+    timestamp = started.strftime("%Y%m%d_%H%M%S")
+
+    # Create a subdirectory for compressed images with format "compress-[size_preset]-[format]-[quality]"
+    format_name = output_format if output_format != 'original' else 'original'
+    compress_dir_name = f"compress-{size_preset}-{format_name}-{quality}"
+
     print_info("Scanning directory for images...")
-    image_paths = [path for path in directory.glob('**/*')
-                  if path.is_file() and path.suffix.lower() in SUPPORTED_FORMATS]
-    total_images = len(image_paths)
 
-    if total_images == 0:
-        print_warning(f"No supported images found in {directory}")
-        return
+    # Compress the images in parallel, one task per file, on threads or processes
+    # depending on file size. GPU runs always use threads so the workers share one
+    # CUDA context. Tasks are submitted while the scan is still running so workers
+    # can start right away.
+    compress = make_compressor(quality, max_width, output_format, preserve_original, size_preset, effort, use_gpu)
+    scan = iter_images(directory, None if in_place else compress_dir_name)
+    sample = list(islice(scan, EXECUTOR_SAMPLE_SIZE))
+    if use_gpu or sample and sum(size for _, size in sample) / len(sample) < SMALL_FILE_THRESHOLD:
+        executor = ThreadPoolExecutor(max_workers=4 * (os.cpu_count() or 1))
+    else:
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count())
 
-    print_info(f"Found {total_images} images to process")
+    with executor:
+        try:
+            futures = {}
+            output_dirs = {}  # source directory -> its created output directory
+            backup_dirs = {}  # source directory -> its 'originals' directory
+            broken = None  # set once the pool breaks while tasks are still being submitted
+            for path, original_size in chain(sample, scan):
+                path = Path(path)
 
-    # Statistics
-    stats = {
-        'processed': 0,
-        'successful': 0,
-        'failed': 0,
-        'total_original_size': 0,
-        'total_compressed_size': 0,
-        'resized_images': 0,
-        'errors': {}
-    }
+                # Once a worker has died, submit fails for every later file. The rest of the
+                # scan is still counted, each file as crashed, so the run ends with a summary.
+                if broken is not None:
+                    future = Future()
+                    future.set_exception(broken)
+                    futures[future] = path
+                    continue
 
-    # Create a timestamp for the report
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                # Output goes next to the original when compressing in place, otherwise into
+                # a compress subdirectory beside it. Each one is created once, on first use.
+                output_dir = output_dirs.get(path.parent)
+                if output_dir is None:
+                    output_dir = output_dirs[path.parent] = path.parent if in_place else path.parent / compress_dir_name
+                    output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Process each file with progress bar if available
-    if PROGRESS_BAR_SUPPORT:
-        iterator = tqdm(image_paths, desc="Compressing images", unit="image")
-    else:
-        iterator = image_paths
-        print_info("Processing images...")
+                # Create output path with sanitized filename and size suffix
+                output_path = output_dir / generate_filename(path.name, size_preset, output_format)
 
-    # Create a subdirectory for compressed images with format "compress-[size_preset]-[format]-[quality]"
-    format_name = output_format if output_format != 'original' else 'original'
-    compress_dir_name = f"compress-{size_preset}-{format_name}-{quality}"
+                # Build each 'originals' path once; the task creates the directory on its
+                # first successful backup, so failed directories don't get an empty one
+                backup_dir = None
+                if preserve_original:
+                    backup_dir = backup_dirs.get(path.parent)
+                    if backup_dir is None:
+                        backup_dir = backup_dirs[path.parent] = path.parent / "originals"
 
-    for path in iterator:
-        stats['processed'] += 1
+                try:
+                    future = executor.submit(compress, path, output_path, original_size=original_size, backup_dir=backup_dir)
+                except BrokenProcessPool as e:
+                    broken = e
+                    future = Future()
+                    future.set_exception(e)
+                futures[future] = path
 
-        # Create output path with sanitized filename
-        relative_path = path.relative_to(directory)
-        parent_dir = relative_path.parent
+                # Workers take tasks in submission order, so read ahead of them
+                if len(futures) <= PREFETCH_DEPTH:
+                    prefetch_file(path)
 
-        if in_place:
-            # Generate the new filename with size suffix for in-place compression
-            new_filename = generate_filename(relative_path.name, size_preset, output_format)
-            # Set the output path to be in the same directory as the original image
-            output_path = directory / parent_dir / new_filename
-            # Create parent directory if it doesn't exist (should already exist)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-        else:
-            # Create a compress subdirectory in the same directory as the original image
-            compress_subdir = parent_dir / compress_dir_name
-            # Generate the new filename with size suffix
-            new_filename = generate_filename(relative_path.name, size_preset, output_format)
-            # Set the output path to be in the compress subdirectory
-            output_path = directory / compress_subdir / new_filename
-            # Create parent directory if it doesn't exist
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # Compress the image
-        if not PROGRESS_BAR_SUPPORT:
-            print_info(f"[{stats['processed']}/{total_images}] Processing: {path}")
-
-        result = compress_image(path, output_path, quality, max_width, output_format, preserve_original, size_preset)
-
-        # Update statistics
-        if isinstance(result, dict) and result.get('success', False):
-            stats['successful'] += 1
-            stats['total_original_size'] += result['original_size']
-            stats['total_compressed_size'] += result['compressed_size']
-            if result.get('was_resized', False):
-                stats['resized_images'] += 1
-        else:
-            stats['failed'] += 1
-            error_type = result.get('error', 'unknown') if isinstance(result, dict) else 'unknown'
-            stats['errors'][error_type] = stats['errors'].get(error_type, 0) + 1
+            # Keep reading ahead one file for every file that finishes
+            prefetch_queue = iter(list(futures.values())[PREFETCH_DEPTH:])
+
+            total_images = len(futures)
+            if total_images == 0:
+                print_warning(f"No supported images found in {directory}")
+                return
+
+            print_info(f"Found {total_images} images to process")
+
+            # Collect results as they finish, with progress bar if available
+            if PROGRESS_BAR_SUPPORT:
+                completed = tqdm(as_completed(futures), total=total_images, desc="Compressing images", unit="image")
+            else:
+                completed = as_completed(futures)
+                print_info("Processing images...")
+
+            # Statistics are kept in locals while results stream in and packed into a dict afterwards
+            processed = successful = failed = resized_images = 0
+            total_original_size = total_compressed_size = 0
+            errors = Counter()
+
+            for future in completed:
+                processed += 1
+                next_path = next(prefetch_queue, None)
+                if next_path is not None:
+                    prefetch_file(next_path)
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # A worker died (e.g. out of memory); count the file instead of aborting the run
+                    result = {
+                        'success': False,
+                        'error': 'worker_crashed',
+                        'messages': [('error', f"Worker crashed while processing {futures[future]}: {e}")]
+                    }
+
+                # Per-file details are only shown when verbose; warnings and errors always are.
+                # With a progress bar they are printed above it instead of breaking it up.
+                messages = result['messages']
+                if not verbose:
+                    messages = [(level, message) for level, message in messages if level in ('warning', 'error')]
+                if not PROGRESS_BAR_SUPPORT:
+                    print_info(f"[{processed}/{total_images}] Processed: {futures[future]}")
+                    print_messages(messages)
+                elif messages:
+                    with tqdm.external_write_mode():
+                        print_messages(messages)
+
+                # Update statistics
+                if result['success']:
+                    successful += 1
+                    total_original_size += result['original_size']
+                    total_compressed_size += result['compressed_size']
+                    if result['was_resized']:
+                        resized_images += 1
+                else:
+                    failed += 1
+                    errors[result['error']] += 1
+        except KeyboardInterrupt:
+            # Drop the queued tasks so Ctrl+C stops the run now; leaving the with
+            # block would otherwise wait for every one of them to finish first.
+            # This waits only for the tasks already running; with wait=False the
+            # with block's own shutdown() would undo the cancellation.
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    stats = {
+        'processed': processed,
+        'successful': successful,
+        'failed': failed,
+        'total_original_size': total_original_size,
+        'total_compressed_size': total_compressed_size,
+        'resized_images': resized_images,
+        'errors': dict(errors)
+    }
 
     # Print summary
     print_header("\nCompression Summary")
@@ -301,37 +846,41 @@ def process_directory(directory, quality, max_width, output_format, preserve_ori
             print_info(f"Resized {stats['resized_images']} images to fit maximum width of {max_width}px")
 
     # Generate report file
-    format_name = output_format if output_format != 'original' else 'original'
-    compress_dir_name = f"compress-{size_preset}-{format_name}-{quality}"
     report_path = directory / f"compression_report_{timestamp}.txt"
     try:
-        with open(report_path, 'w') as f:
-            f.write(f"Image Compression Report - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("=" * 60 + "\n\n")
-            f.write(f"Directory: {directory}\n")
-            f.write(f"Quality: {quality}\n")
-            f.write(f"Size preset: {size_preset} ({max_width}px)\n")
-            f.write(f"Output format: {output_format}\n")
-            f.write(f"Preserve originals: {preserve_original}\n")
-            if in_place:
-                f.write(f"Compressed images location: Same directory as originals\n\n")
-            else:
-                f.write(f"Compressed images directory: {compress_dir_name}/\n\n")
+        lines = [
+            f"Image Compression Report - {started.strftime('%Y-%m-%d %H:%M:%S')}\n",
+            "=" * 60 + "\n\n",
+            f"Directory: {directory}\n",
+            f"Quality: {quality}\n",
+            f"Size preset: {size_preset} ({max_width}px)\n",
+            f"Output format: {output_format}\n",
+            f"Preserve originals: {preserve_original}\n",
+            f"Encoding effort: {effort}\n",
+        ]
+        if in_place:
+            lines.append("Compressed images location: Same directory as originals\n\n")
+        else:
+            lines.append(f"Compressed images directory: {compress_dir_name}/\n\n")
 
-            f.write(f"Total images processed: {stats['processed']}\n")
-            f.write(f"Successfully compressed: {stats['successful']}\n")
-            f.write(f"Failed: {stats['failed']}\n\n")
+        lines.append(f"Total images processed: {stats['processed']}\n")
+        lines.append(f"Successfully compressed: {stats['successful']}\n")
+        lines.append(f"Failed: {stats['failed']}\n\n")
 
-            if stats['successful'] > 0:
-                f.write(f"Original size: {stats['total_original_size']/1024/1024:.2f}MB\n")
-                f.write(f"Compressed size: {stats['total_compressed_size']/1024/1024:.2f}MB\n")
-                f.write(f"Space saved: {saved_space:.2f}MB ({total_reduction:.1f}%)\n")
-                f.write(f"Resized images: {stats['resized_images']}\n\n")
+        if stats['successful'] > 0:
+            lines.append(f"Original size: {stats['total_original_size']/1024/1024:.2f}MB\n")
+            lines.append(f"Compressed size: {stats['total_compressed_size']/1024/1024:.2f}MB\n")
+            lines.append(f"Space saved: {saved_space:.2f}MB ({total_reduction:.1f}%)\n")
+            lines.append(f"Resized images: {stats['resized_images']}\n\n")
 
-            if stats['failed'] > 0:
-                f.write("Errors:\n")
-                for error, count in stats['errors'].items():
-                    f.write(f"  - {error}: {count} images\n")
+        if stats['failed'] > 0:
+            lines.append("Errors:\n")
+            for error, count in stats['errors'].items():
+                lines.append(f"  - {error}: {count} images\n")
+
+        # Write the whole report with a single call
+        with open(report_path, 'w') as f:
+            f.write("".join(lines))
 
         print_info(f"Detailed report saved to: {report_path}")
     except Exception as e:
@@ -341,6 +890,11 @@ def process_directory(directory, quality, max_width, output_format, preserve_ori
 
 def main():
     """Main function to run the interactive image compression script."""
+    if COLOR_SUPPORT:
+        init()  # Initialize colorama
+    for note in DEPENDENCY_NOTES:
+        print(note)
+
     print_header("Image Compression Tool")
     print_info("This tool compresses images in a directory with customizable settings.")
 
@@ -429,6 +983,29 @@ def main():
     # Ask if user wants to preserve original files
     preserve_original = input("\nPreserve original files in an 'originals' subfolder? (y/n, default: n): ").strip().lower() == 'y'
 
+    # Get encoding effort
+    print_info("\nEncoding effort options:")
+    print("1. Standard (default)")
+    print("2. Fast (larger files, for big batches)")
+    print("3. Smallest (slowest encoding)")
+
+    while True:
+        effort_input = input("Choose encoding effort (1-3): ").strip()
+        if not effort_input:
+            effort_input = '1'
+        if effort_input in ('1', '2', '3'):
+            effort = ENCODING_EFFORTS[int(effort_input) - 1]
+            break
+        print_warning("Please enter a valid option (1-3).")
+
+    # Ask if user wants a line for every image instead of just warnings and errors
+    verbose = input("\nShow details for every image? (y/n, default: n): ").strip().lower() == 'y'
+
+    # Ask if user wants to resize on the GPU, when one is available
+    use_gpu = False
+    if CUDA_SUPPORT:
+        use_gpu = input("\nResize images on the GPU? (y/n, default: y): ").strip().lower() != 'n'
+
     # Ask if user wants in-place compression
     print_info("\nOutput location options:")
     print("1. Create subdirectory (default, recommended for organization)")
@@ -456,6 +1033,9 @@ def main():
     print(f"Size preset: {size_preset} ({max_width}px)")
     print(f"Output format: {output_format}")
     print(f"Preserve originals: {'Yes' if preserve_original else 'No'}")
+    print(f"Encoding effort: {effort}")
+    if CUDA_SUPPORT:
+        print(f"Resize on GPU: {'Yes' if use_gpu else 'No'}")
     if in_place:
         print(f"Compressed images will be saved in: Same directory as originals")
     else:
@@ -468,7 +1048,7 @@ def main():
 
     # Process the directory
     try:
-        process_directory(directory, quality, max_width, output_format, preserve_original, size_preset, in_place)
+        process_directory(directory, quality, max_width, output_format, preserve_original, size_preset, in_place, effort, use_gpu, verbose)
         print_success("\nCompression process completed!")
     except KeyboardInterrupt:
         print_warning("\nOperation cancelled by user.")
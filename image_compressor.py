@@ -16,6 +16,9 @@ import os
 import sys
 import re
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 import unicodedata
 
@@ -35,76 +38,176 @@ except ImportError:
         sys.exit(1)
 
 # Supported image formats
-SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff']
+SUPPORTED_FORMATS = frozenset(['.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff'])
 
-def sanitize_filename(filename):
-    """Convert non-English filename to English and sanitize it."""
-    # Get the base name without extension
-    base_name = os.path.splitext(filename)[0]
-    extension = os.path.splitext(filename)[1]
+# The same suffixes as a tuple, for a single str.endswith check
+SUPPORTED_SUFFIXES = tuple(SUPPORTED_FORMATS)
+
+# Pillow save format for each output_format choice; 'original' has none and
+# keeps each source's own format
+SAVE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG'}
 
+# Filename sanitizing patterns, compiled once
+NON_WORD_CHARS = re.compile(r'[^\w\s-]')
+WHITESPACE_RUNS = re.compile(r'\s+')
+
+@lru_cache(maxsize=8192)
+def sanitize_stem(base_name):
+    """Convert a filename without its extension to a lowercase, hyphenated ASCII name.
+
+    Returns an empty string if nothing is left. The result only depends on
+    base_name, so it is cached for names repeated across directories.
+    """
     # Check if the filename contains non-ASCII characters
-    if not all(ord(c) < 128 for c in base_name):
+    if not base_name.isascii():
         # Convert non-ASCII characters to their closest ASCII equivalents
         normalized = unicodedata.normalize('NFKD', base_name)
         # Keep only ASCII characters
-        ascii_text = ''.join(c for c in normalized if ord(c) < 128)
-        # Remove any special characters and replace spaces with hyphens
-        sanitized = re.sub(r'[^\w\s-]', '', ascii_text).strip().lower()
-        sanitized = re.sub(r'[\s]+', '-', sanitized)
-
-        # If nothing remains after sanitization (e.g., all characters were non-ASCII)
-        # generate a simple timestamp-based name
-        if not sanitized:
-            sanitized = f"image-{int(time.time())}"
-    else:
-        # If already ASCII, just sanitize
-        sanitized = re.sub(r'[^\w\s-]', '', base_name).strip().lower()
-        sanitized = re.sub(r'[\s]+', '-', sanitized)
+        base_name = normalized.encode('ascii', 'ignore').decode('ascii')
+
+    # Remove any special characters and replace spaces with hyphens
+    sanitized = NON_WORD_CHARS.sub('', base_name).strip().lower()
+    return WHITESPACE_RUNS.sub('-', sanitized)
+
+def sanitize_filename(filename):
+    """Convert non-English filename to English and sanitize it."""
+    # Get the base name without extension
+    base_name, extension = os.path.splitext(filename)
+    sanitized = sanitize_stem(base_name)
+
+    # If nothing remains after sanitizing a non-ASCII name (e.g., all characters
+    # were non-ASCII) generate a simple timestamp-based name
+    if not sanitized and not base_name.isascii():
+        sanitized = f"image-{int(time.time())}"
 
     return sanitized + extension
 
-def compress_image(input_path, output_path, quality=85, max_width=1920, output_format=None):
-    """Compress an image with the specified settings."""
+def temporary_path(input_path, output_path):
+    """Return the temporary file an output is saved to before being moved into place.
+
+    The temporary name keeps the source extension and the process ID, so
+    sources that share an output name (photo.jpg, photo.png) and two runs over
+    the same directory never write the same file.
+    """
+    return output_path.with_suffix(f"{output_path.suffix}{Path(input_path).suffix}.{os.getpid()}.tmp")
+
+def compress_image(input_path, output_path, quality=85, max_width=1920, output_format=None, original_size=None):
+    """Compress an image with the specified settings.
+
+    original_size can be passed when the caller already knows the input's
+    size (e.g. from the directory scan), saving a stat call.
+
+    Runs in a worker process, so instead of printing it returns
+    (success, lines) and the parent prints the lines, keeping the output of
+    different images from interleaving.
+    """
+    lines = []
     try:
+        # Read the size before saving, since the output can replace the input
+        if original_size is None:
+            original_size = os.path.getsize(input_path)
+
         with Image.open(input_path) as img:
-            # Get original format if output_format is None
-            img_format = output_format or img.format
+            # Keep the source's format when no output format was chosen
+            save_format = SAVE_FORMATS.get(output_format) or img.format
 
-            # Convert format string to Pillow format
-            if img_format.lower() == 'webp':
-                save_format = 'WEBP'
-            elif img_format.lower() in ['jpg', 'jpeg']:
-                save_format = 'JPEG'
-            else:
-                save_format = img_format.upper()
+            # JPEG has no alpha or palette, so convert those up front: the save would fail
+            # otherwise, and the resize then runs on 3-channel data
+            if save_format == 'JPEG' and img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('L' if img.mode == 'LA' else 'RGB')
 
             # Resize if width exceeds max_width
             width, height = img.size
             if width > max_width:
                 ratio = max_width / width
                 new_height = int(height * ratio)
-                img = img.resize((max_width, new_height), Image.LANCZOS)
-                print(f"Resized from {width}x{height} to {max_width}x{new_height}")
-
-            # Save with compression
-            img.save(output_path, format=save_format, quality=quality, optimize=True)
+                # Let libjpeg decode at a reduced 1/2, 1/4 or 1/8 scale that is still at
+                # least the target size, leaving less work for the Lanczos resize
+                if img.format == 'JPEG':
+                    img.draft(img.mode, (max_width, new_height))
+                if img.size != (max_width, new_height):
+                    # Box-reduce by an integer factor first while staying at least 3x the
+                    # target size, so Lanczos runs on a much smaller image
+                    img = img.resize((max_width, new_height), Image.LANCZOS, reducing_gap=3.0)
+                lines.append(f"Resized from {width}x{height} to {max_width}x{new_height}")
+
+            # Save to a temporary file next to the output, then move it into place,
+            # so the output path never holds a half-written image
+            temp_output_path = temporary_path(input_path, output_path)
+            try:
+                img.save(temp_output_path, format=save_format, quality=quality, optimize=True)
+                compressed_size = os.path.getsize(temp_output_path)
+                os.replace(temp_output_path, output_path)
+            except Exception:
+                temp_output_path.unlink(missing_ok=True)
+                raise
 
             # Get file size reduction
-            original_size = os.path.getsize(input_path)
-            compressed_size = os.path.getsize(output_path)
             reduction = (1 - compressed_size / original_size) * 100
 
-            print(f"Compressed: {input_path} -> {output_path}")
-            print(f"Size reduction: {original_size/1024:.1f}KB -> {compressed_size/1024:.1f}KB ({reduction:.1f}%)")
-
-            return True
+            lines.append(f"Compressed: {input_path} -> {output_path}")
+            lines.append(f"Size reduction: {original_size/1024:.1f}KB -> {compressed_size/1024:.1f}KB ({reduction:.1f}%)")
+            return True, lines
     except UnidentifiedImageError:
-        print(f"Skipping unsupported file: {input_path}")
-        return False
+        lines.append(f"Skipping unsupported file: {input_path}")
+        return False, lines
     except Exception as e:
-        print(f"Error processing {input_path}: {e}")
-        return False
+        lines.append(f"Error processing {input_path}: {e}")
+        return False, lines
+
+def compress_group(jobs, quality, max_width, output_format):
+    """Compress a group of (input, output, size) jobs one after another.
+
+    Returns a (input, success, lines) tuple per job, in the order given.
+    """
+    return [(path, *compress_image(path, output_path, quality, max_width, output_format, original_size))
+            for path, output_path, original_size in jobs]
+
+def group_jobs(jobs):
+    """Split jobs into groups that have to run one after another.
+
+    Two jobs land in the same group when they share an output path (a.jpg and
+    a.png both writing a.png), or when one's output is the other's input.
+    Running them in parallel would race on that file. Each group keeps the
+    scan order, so the last job written wins as in a sequential run.
+    """
+    parent = list(range(len(jobs)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Join every job to the first job that touched each of its paths
+    first_user = {}
+    for i, (path, output_path, _) in enumerate(jobs):
+        for key in (path, output_path):
+            parent[find(i)] = find(first_user.setdefault(key, i))
+
+    groups = {}
+    for i, job in enumerate(jobs):
+        groups.setdefault(find(i), []).append(job)
+    return list(groups.values())
+
+def iter_images(root):
+    """Yield (path, size in bytes) for the supported images under root, recursively.
+
+    os.scandir gets each entry's type from the directory listing, so unlike
+    Path.glob plus is_file() only the images themselves are stat'ed.
+    Directories that can't be read are skipped, as glob skipped them.
+    """
+    try:
+        it = os.scandir(root)
+    except OSError as e:
+        print(f"Skipping unreadable directory {root}: {e}")
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_images(entry.path)
+            elif entry.name.lower().endswith(SUPPORTED_SUFFIXES) and entry.is_file():
+                yield entry.path, entry.stat().st_size
 
 def process_directory(directory, quality, max_width, output_format):
     """Process all images in a directory and its subdirectories."""
@@ -113,34 +216,58 @@ def process_directory(directory, quality, max_width, output_format):
         print(f"Directory not found: {directory}")
         return
 
-    # Count total images for progress tracking
-    total_images = sum(1 for path in directory.glob('**/*') if path.is_file() and path.suffix.lower() in SUPPORTED_FORMATS)
-    processed = 0
-    successful = 0
+    # Start each run with an empty filename cache
+    sanitize_stem.cache_clear()
 
-    print(f"Found {total_images} images to process")
+    # Collect every (input, output) pair before compressing anything, so files
+    # written during the run are never picked up as inputs
+    jobs = []
+    for path, original_size in iter_images(directory):
+        path = Path(path)
 
-    # Process each file
-    for path in directory.glob('**/*'):
-        if path.is_file() and path.suffix.lower() in SUPPORTED_FORMATS:
-            processed += 1
+        # Create output path with sanitized filename
+        relative_path = path.relative_to(directory)
+        sanitized_name = sanitize_filename(relative_path.name)
+        output_path = directory / relative_path.parent / sanitized_name
 
-            # Create output path with sanitized filename
-            relative_path = path.relative_to(directory)
-            sanitized_name = sanitize_filename(relative_path.name)
-            output_path = directory / relative_path.parent / sanitized_name
+        # Change extension if output format is specified
+        if output_format and output_format != 'original':
+            output_path = output_path.with_suffix(f'.{output_format}')
 
-            # Change extension if output format is specified
-            if output_format and output_format != 'original':
-                output_path = output_path.with_suffix(f'.{output_format}')
+        # Create parent directory if it doesn't exist
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        jobs.append((path, output_path, original_size))
 
-            # Create parent directory if it doesn't exist
-            output_path.parent.mkdir(parents=True, exist_ok=True)
+    total_images = len(jobs)
+    processed = 0
+    successful = 0
 
-            # Compress the image
-            print(f"[{processed}/{total_images}] Processing: {path}")
-            if compress_image(path, output_path, quality, max_width, output_format):
-                successful += 1
+    print(f"Found {total_images} images to process")
+
+    # Compress the images in parallel, one worker process per core; jobs that
+    # share a file run one after another in the same worker
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        try:
+            futures = {executor.submit(compress_group, group, quality, max_width, output_format): group
+                       for group in group_jobs(jobs)}
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    results = [(path, False, [f"Error processing {path}: worker process crashed"])
+                               for path, _, _ in futures[future]]
+                for path, success, lines in results:
+                    processed += 1
+                    if success:
+                        successful += 1
+                    # Only this process prints, so each image's lines come out together
+                    lines.append(f"[{processed}/{total_images}] Processed: {path}")
+                    print("\n".join(lines))
+        except KeyboardInterrupt:
+            # Drop the queued jobs so Ctrl+C stops the run once the running ones finish,
+            # instead of after all of them
+            executor.shutdown(cancel_futures=True)
+            raise
 
     print(f"\nCompression complete: {successful} of {processed} images processed successfully")
 
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Numba Lanczos Resampler
+
+Separable Lanczos resize for uint8 image arrays, compiled with Numba.
+The filter weights for each (source, destination) length pair are built
+once and cached. Both passes run the same row kernel, which blends whole
+source rows so the inner loop is a contiguous multiply-add that LLVM can
+vectorize; the horizontal pass runs it on a transposed copy. The taps are
+fixed-point int16 and accumulate in int32, which vectorizes to wider
+integer multiply-adds than float32 would.
+
+The kernels are single-threaded on purpose: compress_images.py already
+runs one worker per core. They release the GIL so thread workers can run
+them concurrently.
+
+lanczos_resize_cuda does the same resize on an NVIDIA GPU when CuPy is
+installed, as one dense matrix product per pass.
+"""
+
+import math
+
+import numpy as np
+from numba import njit
+
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+# Lanczos window size (number of lobes)
+LANCZOS_A = 3
+
+# Fractional bits of the fixed-point filter taps (Q14: a tap of 1.0 is 16384)
+WEIGHT_BITS = 14
+
+# Cache of (starts, weights) keyed by (source length, destination length)
+_weights_cache = {}
+
+# Dense weight matrices already copied to the GPU, with the same keys
+_cuda_weights_cache = {}
+
+
+@njit("float64(float64, int64)", fastmath=True, nogil=True, cache=True)
+def _lanczos(x, a):
+    """Evaluate the Lanczos kernel with `a` lobes at x."""
+    if x == 0.0:
+        return 1.0
+    if x <= -a or x >= a:
+        return 0.0
+    px = math.pi * x
+    return a * math.sin(px) * math.sin(px / a) / (px * px)
+
+
+@njit("Tuple((int32[::1], float32[:, ::1]))(int64, int64, int64)", fastmath=True, nogil=True, cache=True)
+def _build_weights(src, dst, a):
+    """Build the first source index and normalized filter taps of every output pixel."""
+    scale = src / dst
+    filterscale = max(scale, 1.0)
+    support = a * filterscale
+    ksize = int(math.ceil(support)) * 2 + 1
+
+    starts = np.empty(dst, np.int32)
+    weights = np.zeros((dst, ksize), np.float32)
+    for i in range(dst):
+        center = (i + 0.5) * scale
+        lo = max(int(center - support + 0.5), 0)
+        hi = min(int(center + support + 0.5), src)
+        total = 0.0
+        for j in range(lo, hi):
+            w = _lanczos((j - center + 0.5) / filterscale, a)
+            weights[i, j - lo] = w
+            total += w
+        if total != 0.0:
+            for k in range(hi - lo):
+                weights[i, k] /= total
+        starts[i] = lo
+    return starts, weights
+
+
+@njit("uint8[:, :, ::1](uint8[:, :, ::1], int32[::1], int16[:, ::1])", fastmath=True, nogil=True, cache=True)
+def _resample_rows(img, starts, weights):
+    """Resample img along its first axis to len(starts) rows, with Q14 taps."""
+    height, width, channels = img.shape
+    dst_h, ksize = weights.shape
+    row_len = width * channels
+    src = img.reshape(height, row_len)
+    out = np.empty((dst_h, width, channels), np.uint8)
+    dst = out.reshape(dst_h, row_len)
+    acc = np.empty(row_len, np.int32)
+    for y in range(dst_h):
+        start = starts[y]
+        taps = min(ksize, height - start)
+        acc[:] = 1 << (WEIGHT_BITS - 1)  # rounds the final shift to nearest
+        for k in range(taps):
+            w = np.int32(weights[y, k])
+            src_row = src[start + k]
+            for i in range(row_len):
+                acc[i] += np.int32(src_row[i]) * w
+        for i in range(row_len):
+            dst[y, i] = min(max(acc[i] >> WEIGHT_BITS, 0), 255)
+    return out
+
+
+def get_weights(src, dst):
+    """Return the cached Q14 Lanczos taps for resampling src pixels to dst pixels."""
+    key = (src, dst)
+    if key not in _weights_cache:
+        starts, weights = _build_weights(src, dst, LANCZOS_A)
+        fixed = np.round(weights * (1 << WEIGHT_BITS)).astype(np.int32)
+        # Put the rounding error on each row's largest tap so every row still sums
+        # to exactly 1.0 and flat areas come out unchanged
+        peaks = np.abs(fixed).argmax(axis=1)
+        fixed[np.arange(dst), peaks] += (1 << WEIGHT_BITS) - fixed.sum(axis=1)
+        _weights_cache[key] = starts, fixed.astype(np.int16)
+    return _weights_cache[key]
+
+
+def get_cuda_weights(src, dst):
+    """Return the Lanczos weights for src -> dst pixels as a dense (dst, src) matrix on the GPU."""
+    key = (src, dst)
+    if key not in _cuda_weights_cache:
+        starts, weights = get_weights(src, dst)
+        cols = starts[:, None] + np.arange(weights.shape[1])
+        rows = np.broadcast_to(np.arange(dst)[:, None], cols.shape)
+        inside = cols < src
+        dense = np.zeros((dst, src), np.float32)
+        dense[rows[inside], cols[inside]] = weights[inside] / (1 << WEIGHT_BITS)
+        _cuda_weights_cache[key] = cp.asarray(dense)
+    return _cuda_weights_cache[key]
+
+
+def lanczos_resize(pixels, new_width, new_height):
+    """Resize a uint8 image of shape (h, w) or (h, w, c) with the Lanczos filter.
+
+    Accepts anything np.asarray understands, including Pillow images in 'L'
+    or 'RGB' mode, and returns a new uint8 array.
+    """
+    pixels = np.asarray(pixels)
+    squeeze = pixels.ndim == 2
+    # Copy into a writable C-contiguous array: np.asarray(pil_image) is read-only
+    img = np.array(pixels[:, :, None] if squeeze else pixels, dtype=np.uint8, order='C')
+    height, width = img.shape[:2]
+
+    # Shrink rows first so the transposed horizontal pass works on less data
+    if new_height != height:
+        img = _resample_rows(img, *get_weights(height, new_height))
+    if new_width != width:
+        img = np.ascontiguousarray(img.transpose(1, 0, 2))
+        img = _resample_rows(img, *get_weights(width, new_width))
+        img = np.ascontiguousarray(img.transpose(1, 0, 2))
+
+    return img[:, :, 0] if squeeze else img
+
+
+def lanczos_resize_cuda(pixels, new_width, new_height):
+    """Resize like lanczos_resize, but on the GPU with CuPy.
+
+    Each pass is a single float32 matrix product with the dense weight
+    matrix, which cuBLAS runs far faster than a per-tap loop.
+    """
+    pixels = np.asarray(pixels)
+    squeeze = pixels.ndim == 2
+    img = cp.asarray(pixels[:, :, None] if squeeze else pixels).astype(cp.float32)
+    height, width, channels = img.shape
+
+    if new_height != height:
+        rows = get_cuda_weights(height, new_height) @ img.reshape(height, width * channels)
+        img = rows.reshape(new_height, width, channels)
+    if new_width != width:
+        img = (img.transpose(0, 2, 1) @ get_cuda_weights(width, new_width).T).transpose(0, 2, 1)
+
+    out = cp.asnumpy(cp.clip(cp.floor(img + 0.5), 0, 255).astype(cp.uint8))
+    return out[:, :, 0] if squeeze else out